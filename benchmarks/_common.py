@@ -0,0 +1,55 @@
+# =============================================================================
+# Shared helpers for the benchmark scripts
+# =============================================================================
+# Each benchmark copies one part of the course into a temp folder and imports
+# its app from there, so runs never touch the part's real instance/todo.db.
+
+import importlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+from werkzeug.serving import make_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_part(part='part-7-admin-panel'):
+    """Copy a part to a temp folder, import its app.py and return the module."""
+    workdir = tempfile.mkdtemp(prefix='todo-bench-')
+    shutil.copytree(os.path.join(ROOT, part), workdir, dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns('instance', '__pycache__'))
+    # No chdir: the database lives in the copy's instance/ folder anyway, and
+    # paths given on the command line (--output, --compare) stay relative
+    # to where the benchmark was started
+    sys.path.insert(0, workdir)
+    return importlib.import_module('app')
+
+
+def serve(app):
+    """Start the app on a threaded local server. Returns (base_url, server)."""
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    return {
+        'count': len(samples_ms),
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p90_ms': round(percentile(samples_ms, 90), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+        'max_ms': round(max(samples_ms), 3) if samples_ms else 0.0,
+    }
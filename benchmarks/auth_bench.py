@@ -0,0 +1,160 @@
+# =============================================================================
+# Benchmark: authentication helpers
+# =============================================================================
+# Times the auth.py functions of part 6, 7 or 8 and the full "who is calling?"
+# path of a protected request against a seeded SQLite database. Prints ops/sec
+# and latency percentiles, optionally saves them as JSON and compares them
+# with an earlier run. Part 6's access log is switched off while timing.
+#
+#   python benchmarks/auth_bench.py --part part-7-admin-panel --output before.json
+#   ... change something ...
+#   python benchmarks/auth_bench.py --part part-7-admin-panel --compare before.json
+
+import argparse
+import inspect
+import json
+import platform
+import sys
+import time
+
+from _common import load_part, summarize
+
+# Users created before timing, so lookups hit a realistically sized table
+SEED_USERS = 1000
+
+
+def bench(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    result = summarize(samples)
+    total = sum(samples) / 1000
+    result['ops_per_sec'] = round(iterations / total, 1) if total else 0.0
+    return result
+
+
+def seed(module, auth):
+    db, User = module.db, module.User
+    with module.app.app_context():
+        password_hash = auth.hash_password('bench-password')
+        db.session.add_all([
+            User(username=f'bench{i}', email=f'bench{i}@example.com', password_hash=password_hash)
+            for i in range(SEED_USERS)
+        ])
+        db.session.commit()
+        user = User.query.filter_by(email=f'bench{SEED_USERS // 2}@example.com').first()
+        return user.id, password_hash
+
+
+def make_token(auth, user_id):
+    # create_token grew extra claims over the parts; pass what this part takes
+    params = inspect.signature(auth.create_token).parameters
+    return auth.create_token(*[user_id, False, 0][:len(params)])
+
+
+def run(part, iterations, hash_iterations):
+    module = load_part(part)
+    import auth  # the part's auth.py, importable once load_part() ran
+    try:
+        import access_log  # Only parts with the access log have it
+    except ImportError:
+        access_log = None
+    if access_log:
+        # Keep log lines out of the results and their cost out of the timings
+        access_log.SAMPLE_RATE = 0
+
+    user_id, password_hash = seed(module, auth)
+    token = make_token(auth, user_id)
+    app = module.app
+
+    # Part 6 takes (password_hash, password), parts 7 and 8 take (password, password_hash)
+    first = next(iter(inspect.signature(auth.verify_password).parameters))
+    if first == 'password_hash':
+        verify = lambda: auth.verify_password(password_hash, 'bench-password')
+    else:
+        verify = lambda: auth.verify_password('bench-password', password_hash)
+
+    # The full path of a protected request, minus the route itself
+    if hasattr(auth, 'get_current_user'):
+        def identify():
+            with app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+                user, error = auth.get_current_user()
+                assert error is None
+    else:
+        protected = auth.token_required(lambda user: ('', 204))
+
+        def identify():
+            with app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+                protected()
+
+    def identify_cold():
+        cache = getattr(auth, '_token_cache', None)
+        if cache is not None:
+            cache.clear()
+        identify()
+
+    results = {
+        'create_token': bench(lambda: make_token(auth, user_id), iterations),
+        'decode_token': bench(lambda: auth.decode_token(token), iterations),
+        'hash_password': bench(lambda: auth.hash_password('bench-password'), hash_iterations),
+        'verify_password': bench(verify, hash_iterations),
+        'current_user_cold': bench(identify_cold, iterations),
+        'current_user_warm': bench(identify, iterations),
+    }
+    return {
+        'part': part,
+        'python': platform.python_version(),
+        'seed_users': SEED_USERS,
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Print the change in p50 per benchmark. Returns True if any got slower than threshold %."""
+    regressed = False
+    print(f"\n{'benchmark':<20} {'before p50':>12} {'after p50':>12} {'change':>9}")
+    for name, after in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before or not before['p50_ms']:
+            continue
+        change = (after['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100
+        flag = '  <-- slower' if change > threshold else ''
+        regressed = regressed or change > threshold
+        print(f"{name:<20} {before['p50_ms']:>10.3f}ms {after['p50_ms']:>10.3f}ms {change:>+8.1f}%{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--part', default='part-7-admin-panel',
+                        choices=['part-6-protected-routes', 'part-7-admin-panel', 'part-8-homework'])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--hash-iterations', type=int, default=20)
+    parser.add_argument('--output', help='save results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier run')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent p50 slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    current = run(args.part, args.iterations, args.hash_iterations)
+
+    print(f"\n{'benchmark':<20} {'ops/sec':>12} {'p50':>10} {'p90':>10} {'p99':>10}")
+    for name, r in current['results'].items():
+        print(f"{name:<20} {r['ops_per_sec']:>12.1f} {r['p50_ms']:>8.3f}ms "
+              f"{r['p90_ms']:>8.3f}ms {r['p99_ms']:>8.3f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(current, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# =============================================================================
+# Benchmark: todo latency during a login storm
+# =============================================================================
+# Measures GET /api/todos latency on a quiet server, then again while many
+# client processes hammer POST /api/login. With password hashing running in the
+# process pool (auth.HASH_WORKERS > 0) the todo p99 should stay flat;
+# run with --inline to compare against hashing on the request threads.
+#
+# Every storm login uses the same email and IP, so part 7's login throttle
+# is lifted unless --throttle is given; otherwise nearly every login would
+# get 429 and the hashing path would never run.
+#
+#   python benchmarks/login_storm.py [--part part-8-homework] [--inline] [--throttle]
+
+import argparse
+import json
+import multiprocessing
+import time
+import urllib.error
+import urllib.request
+
+from _common import load_part, serve, summarize
+
+
+def call(url, method='GET', body=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(req) as res:
+            return res.status, json.loads(res.read() or b'null')
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def measure_todos(base, token, requests):
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        call(f'{base}/api/todos', token=token)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def login_storm(base, stop, results):
+    # Runs in its own process so the storm clients don't share the server's GIL.
+    # Counts are kept locally and handed back once: a shared dict's
+    # read-then-write from several processes would lose updates.
+    statuses = {}
+    while not stop.is_set():
+        status, _ = call(f'{base}/api/login', 'POST',
+                         {'email': 'storm@example.com', 'password': 'storm-password'})
+        statuses[status] = statuses.get(status, 0) + 1
+    results.append(statuses)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--part', default='part-7-admin-panel')
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--storm-clients', type=int, default=16)
+    parser.add_argument('--inline', action='store_true', help='hash on the request thread')
+    parser.add_argument('--throttle', action='store_true', help='keep the login throttle limits')
+    args = parser.parse_args()
+
+    module = load_part(args.part)
+    import auth  # the part's auth.py, importable once load_part() ran
+    if args.inline:
+        auth.HASH_WORKERS = 0
+    try:
+        import throttle  # Only parts with login throttling have it
+    except ImportError:
+        throttle = None
+    if throttle and not args.throttle:
+        throttle.LIMITS = {kind: (10 ** 9, 10 ** 9) for kind in throttle.LIMITS}
+    base, server = serve(module.app)
+
+    call(f'{base}/api/register', 'POST', {'username': 'storm', 'email': 'storm@example.com',
+                                          'password': 'storm-password'})
+    _, data = call(f'{base}/api/login', 'POST',
+                   {'email': 'storm@example.com', 'password': 'storm-password'})
+    token = data['token']
+    for i in range(20):
+        call(f'{base}/api/todos', 'POST', {'task_content': f'task {i}'}, token)
+
+    quiet = measure_todos(base, token, args.requests)
+
+    manager = multiprocessing.Manager()
+    stop, results = manager.Event(), manager.list()
+    stormers = [multiprocessing.Process(target=login_storm, args=(base, stop, results))
+                for _ in range(args.storm_clients)]
+    for p in stormers:
+        p.start()
+    time.sleep(0.5)
+    stormy = measure_todos(base, token, args.requests)
+    stop.set()
+    for p in stormers:
+        p.join()
+    server.shutdown()
+
+    statuses = {}
+    for counts in results:
+        for status, count in counts.items():
+            statuses[status] = statuses.get(status, 0) + count
+
+    print(json.dumps({
+        'part': args.part,
+        'hashing': 'inline' if args.inline else f'{auth.HASH_WORKERS} workers',
+        'todos_quiet': summarize(quiet),
+        'todos_during_storm': summarize(stormy),
+        'login_statuses': statuses,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
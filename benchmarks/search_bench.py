@@ -0,0 +1,94 @@
+# =============================================================================
+# Benchmark: todo search
+# =============================================================================
+# Fills part 7 with --rows todos spread over --users users, then times
+# GET /api/todos/search for random one- and two-word queries, next to the
+# same search done with LIKE '%word%' over the user's todos.
+#
+#   python benchmarks/search_bench.py [--rows 1000000] [--users 100]
+#
+# Filling a million rows takes a few minutes (every insert also runs the
+# counter, sync and search triggers).
+
+import argparse
+import json
+import random
+import time
+
+from _common import load_part, summarize
+
+BATCH = 10000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--words', type=int, default=5000, help='vocabulary size')
+    args = parser.parse_args()
+
+    random.seed(1)
+    vocabulary = [f'word{i}' for i in range(args.words)]
+
+    module = load_part('part-7-admin-panel')
+    from models import db, User, Todo, search_available, search_match, search_todos
+    from auth import create_token
+    app = module.app
+
+    with app.app_context():
+        if not search_available():
+            raise SystemExit('SQLite was built without FTS5')
+
+        db.session.execute(db.insert(User), [
+            {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x'}
+            for i in range(args.users)
+        ])
+        user_ids = db.session.scalars(db.select(User.id).where(User.password_hash == 'x')).all()
+        db.session.commit()
+
+        start = time.perf_counter()
+        for offset in range(0, args.rows, BATCH):
+            db.session.execute(db.insert(Todo), [
+                {'task_content': ' '.join(random.choices(vocabulary, k=random.randint(3, 8))),
+                 'user_id': random.choice(user_ids)}
+                for _ in range(min(BATCH, args.rows - offset))
+            ])
+            db.session.commit()
+        fill_seconds = time.perf_counter() - start
+
+    client = app.test_client()
+    tokens = {user_id: create_token(user_id) for user_id in user_ids}
+    queries = [(random.choice(user_ids), ' '.join(random.sample(vocabulary, random.randint(1, 2))))
+               for _ in range(args.queries)]
+
+    endpoint, fts, like = [], [], []
+    for user_id, text in queries:
+        headers = {'Authorization': f'Bearer {tokens[user_id]}'}
+        begin = time.perf_counter()
+        response = client.get('/api/todos/search', headers=headers, query_string={'q': text})
+        endpoint.append((time.perf_counter() - begin) * 1000)
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+        with app.app_context():
+            begin = time.perf_counter()
+            search_todos(search_match(user_id, text), 100)
+            fts.append((time.perf_counter() - begin) * 1000)
+
+            conditions = [Todo.task_content.like(f'%{word}%') for word in text.split()]
+            begin = time.perf_counter()
+            db.session.execute(db.select(Todo.id).where(Todo.user_id == user_id, *conditions).limit(100)).all()
+            like.append((time.perf_counter() - begin) * 1000)
+
+    print(json.dumps({
+        'rows': args.rows,
+        'users': args.users,
+        'fill_seconds': round(fill_seconds, 1),
+        'search_endpoint': summarize(endpoint),
+        'fts5_query': summarize(fts),
+        'like_query': summarize(like),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
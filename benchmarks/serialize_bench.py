@@ -0,0 +1,86 @@
+# =============================================================================
+# Benchmark: todo list serialization
+# =============================================================================
+# Compares the two ways of answering GET /api/todos for one user with many
+# todos: ORM objects + to_dict() + jsonify() against column tuples +
+# models.todos_json(). Reports time per call and peak allocated memory.
+#
+#   python benchmarks/serialize_bench.py [--rows 10000]
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from _common import load_part, summarize
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = summarize(samples)
+    result['peak_kb'] = round(peak / 1024, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    module = load_part('part-7-admin-panel')
+    from models import db, User, Todo, TODO_COLUMNS, todos_json
+    app = module.app
+
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        db.session.execute(db.insert(Todo), [
+            {'task_content': f'Task number {i} with "quotes" and ünïcode',
+             'is_completed': i % 3 == 0, 'user_id': user.id}
+            for i in range(args.rows)
+        ])
+        db.session.commit()
+        user_id = user.id
+
+    def orm_path():
+        with app.test_request_context():
+            todos = Todo.query.filter_by(user_id=user_id).all()
+            body = module.jsonify({'todos': [todo.to_dict() for todo in todos]}).get_data()
+            db.session.remove()
+            return body
+
+    def fast_path():
+        with app.test_request_context():
+            rows = db.session.execute(
+                db.select(*TODO_COLUMNS).where(Todo.user_id == user_id)
+            ).all()
+            body = todos_json(rows)
+            db.session.remove()
+            return body
+
+    assert json.loads(orm_path()) == json.loads(fast_path()), 'outputs differ'
+
+    orm, fast = measure(orm_path, args.repeat), measure(fast_path, args.repeat)
+    print(json.dumps({
+        'rows': args.rows,
+        'orm_to_dict_jsonify': orm,
+        'core_tuples_todos_json': fast,
+        'speedup_p50': round(orm['p50_ms'] / fast['p50_ms'], 2),
+        'memory_ratio': round(orm['peak_kb'] / fast['peak_kb'], 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# =============================================================================
+# Part 6: Access Log
+# =============================================================================
+# Request handlers only put a record on a queue. A background thread writes
+# the records in batches, so a request never waits for log output.
+
+import atexit
+import json
+import queue
+import random
+import sys
+import threading
+import time
+
+SAMPLE_RATE = 1.0       # Fraction of requests to log (0.1 = every 10th on average)
+BATCH_SIZE = 200
+FLUSH_SECONDS = 1.0     # Write at least this often when records are waiting
+QUEUE_SIZE = 10000      # When full, new records are dropped instead of blocking
+LOG_FILE = None         # Path to append to; None = stdout
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_stop = object()
+_writer = None
+_writer_lock = threading.Lock()
+dropped = 0
+
+
+def _write(batch, out):
+    out.write(''.join(json.dumps(record) + '\n' for record in batch))
+    out.flush()
+
+
+def _run():
+    out = open(LOG_FILE, 'a') if LOG_FILE else sys.stdout
+    batch = []
+    deadline = time.monotonic() + FLUSH_SECONDS
+    while True:
+        try:
+            record = _queue.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            record = None
+
+        if record is _stop:
+            if batch:
+                _write(batch, out)
+            break
+        if record is not None:
+            batch.append(record)
+
+        if len(batch) >= BATCH_SIZE or (batch and time.monotonic() >= deadline):
+            _write(batch, out)
+            batch = []
+        if time.monotonic() >= deadline:
+            deadline = time.monotonic() + FLUSH_SECONDS
+
+    if out is not sys.stdout:
+        out.close()
+
+
+def _start():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_run, name='access-log', daemon=True)
+            _writer.start()
+            atexit.register(shutdown)
+
+
+def log_request(**record):
+    """Queue one access record. Never blocks."""
+    global dropped
+    if SAMPLE_RATE < 1.0 and random.random() >= SAMPLE_RATE:
+        return
+    if _writer is None:
+        _start()
+
+    record['ts'] = time.time()
+    try:
+        _queue.put_nowait(record)
+    except queue.Full:
+        dropped += 1
+
+
+def shutdown(timeout=5):
+    """Write everything still queued. Registered with atexit."""
+    if _writer is None or not _writer.is_alive():
+        return
+    try:
+        _queue.put(_stop, timeout=timeout)
+    except queue.Full:
+        return
+    _writer.join(timeout)
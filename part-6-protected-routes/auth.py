@@ -95,14 +95,19 @@
 # =============================================================================
 
 import jwt
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import request, jsonify
+from flask import request, jsonify, make_response
 from werkzeug.security import generate_password_hash, check_password_hash
 from models import User
+from access_log import log_request
 
 SECRET_KEY = "your-secret-key-change-in-production"
 TOKEN_EXPIRATION_HOURS = 24
+TOKEN_CACHE_SIZE = 1024  # Max verified tokens kept in memory
 
 
 def hash_password(password):
@@ -129,12 +134,55 @@ def decode_token(token):
         return None
 
 
+# ==========================================================
+# VERIFIED TOKEN CACHE
+# ==========================================================
+# Verified tokens are remembered with their claims and a copy of the user
+# until they expire, so repeat requests skip the HMAC check and the user query.
+
+class CachedUser:
+    """Detached copy of the user fields the routes read."""
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.is_admin = user.is_admin
+
+
+_token_cache = OrderedDict()  # token -> (exp, claims, CachedUser), oldest first
+_token_cache_lock = threading.Lock()
+
+
+def _cached_token(token):
+    with _token_cache_lock:
+        entry = _token_cache.get(token)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del _token_cache[token]
+            return None
+        _token_cache.move_to_end(token)
+        return entry
+
+
+def _cache_token(token, claims, user):
+    snapshot = CachedUser(user)
+    with _token_cache_lock:
+        _token_cache[token] = (claims['exp'], claims, snapshot)
+        _token_cache.move_to_end(token)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return snapshot
+
+
 # ==========================================================
 # TOKEN REQUIRED DECORATOR
 # ==========================================================
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        start = time.perf_counter()
         auth_header = request.headers.get('Authorization')
 
         if not auth_header:
@@ -145,17 +193,30 @@ def token_required(f):
         except:
             return jsonify({'error': 'Invalid authorization format'}), 401
 
-        data = decode_token(token)
-        if not data:
-            return jsonify({'error': 'Invalid or expired token'}), 401
-
-        user = User.query.get(data['user_id'])
-        if not user:
-            return jsonify({'error': 'User not found'}), 401
-
-        # Logging user activity
-        print(f"[LOG] User {user.username} (ID: {user.id}) accessed {request.path}")
-
-        return f(user, *args, **kwargs)
+        cached = _cached_token(token)
+        if cached:
+            user = cached[2]
+        else:
+            data = decode_token(token)
+            if not data:
+                return jsonify({'error': 'Invalid or expired token'}), 401
+
+            user = User.query.get(data['user_id'])
+            if not user:
+                return jsonify({'error': 'User not found'}), 401
+
+            user = _cache_token(token, data, user)
+
+        response = make_response(f(user, *args, **kwargs))
+
+        # Logging user activity (written by a background thread)
+        log_request(
+            user_id=user.id,
+            method=request.method,
+            path=request.path,
+            status=response.status_code,
+            latency_ms=round((time.perf_counter() - start) * 1000, 3)
+        )
+        return response
 
     return decorated
@@ -277,18 +277,50 @@
 # Part 7: Admin Panel (Activities Completed)
 # =============================================================================
 
-from flask import Flask, request, jsonify, render_template
-from models import db, User, Todo
-from auth import hash_password, verify_password, create_token, get_current_user, get_admin_user
+import base64
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import Flask, Response, request, jsonify, render_template, abort, stream_with_context
+from models import (db, User, Todo, TodoTombstone, upgrade_db, repair_todo_counters, prune_tombstones,
+                    TODO_COLUMNS, todos_json, todo_row_json, search_available, search_match,
+                    search_todos, rebuild_search_index, admin_todo_row_json, USER_STATS_COLUMNS,
+                    user_stats_row_json)
+from auth import (hash_password, verify_password, create_token, get_current_user, get_admin_user,
+                  invalidate_user, bump_token_version, revoke_current_token, configure_hashing,
+                  needs_rehash, rehash_in_background, HashingBusy)
+from revocation import load_revocations, prune_expired
+from throttle import check_login
+from events import subscribe, unsubscribe, publish, Dropped
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///todo.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+TODO_PAGE_SIZE = 100      # Todos per page in GET /api/todos
+TODO_MAX_PAGE_SIZE = 500
+BULK_MAX_TODOS = 1000     # Max todos in one POST /api/todos/bulk
+TODO_VERSION_TTL = 5      # Seconds a cached todos_version is trusted (other workers' writes)
+STREAM_MAX_SECONDS = 300  # Streams are closed after this; the browser reconnects and re-authenticates
+ADMIN_PAGE_SIZE = 50      # Rows per page in admin listings
+ADMIN_MAX_PAGE_SIZE = 200
+STATS_TTL = 5             # Seconds admin stats are cached (other workers' writes)
+OVERVIEW_WORKERS = 3      # Threads running the parts of /api/admin/overview
+STREAM_BATCH_SIZE = 1000  # Rows read per query when streaming a whole table (?stream=1)
+
 db.init_app(app)
+configure_hashing()
 
 with app.app_context():
     db.create_all()
+    upgrade_db()
+    prune_expired()
+    prune_tombstones()
+    load_revocations()
 
     admin = User.query.filter_by(email='admin@example.com').first()
     if not admin:
@@ -352,14 +384,20 @@ def register():
     if User.query.filter_by(username=data['username']).first():
         return jsonify({'error': 'Username already taken'}), 400
 
+    try:
+        password_hash = hash_password(data['password'])
+    except HashingBusy:
+        return jsonify({'error': 'Server is busy, please try again'}), 503, {'Retry-After': '1'}
+
     user = User(
         username=data['username'],
         email=data['email'],
-        password_hash=hash_password(data['password'])
+        password_hash=password_hash
     )
 
     db.session.add(user)
     db.session.commit()
+    stats_changed()
 
     return jsonify({'message': 'Registration successful'}), 201
 
@@ -368,12 +406,27 @@ def register():
 def login():
     data = request.get_json()
 
+    # Refuse floods before doing any password hashing work
+    wait = check_login(data['email'], request.remote_addr)
+    if wait:
+        return (jsonify({'error': 'Too many login attempts, please wait'}), 429,
+                {'Retry-After': str(math.ceil(wait))})
+
     user = User.query.filter_by(email=data['email']).first()
 
-    if not user or not verify_password(data['password'], user.password_hash):
+    try:
+        password_ok = user and verify_password(data['password'], user.password_hash)
+    except HashingBusy:
+        return jsonify({'error': 'Server is busy, please try again'}), 503, {'Retry-After': '1'}
+
+    if not password_ok:
         return jsonify({'error': 'Invalid email or password'}), 401
 
-    token = create_token(user.id)
+    # Upgrade hashes made with an older hashing policy
+    if needs_rehash(user.password_hash):
+        rehash_in_background(user.id, user.password_hash, data['password'])
+
+    token = create_token(user.id, user.is_admin, user.token_version)
 
     return jsonify({
         'message': 'Login successful',
@@ -387,9 +440,81 @@ def login():
     })
 
 
+@app.route('/api/logout', methods=['POST'])
+def logout():
+    current_user, error = get_current_user()
+    if error:
+        return error
+
+    revoke_current_token()
+    return jsonify({'message': 'Logged out'})
+
+
 # ============================================
 # TODO API (Protected)
 # ============================================
+# GET /api/todos is paged with a cursor instead of OFFSET: the cursor holds
+# the (created_at, id) of the last todo sent, and the next page starts right
+# after it using the index, so page 100 is as fast as page 1.
+
+# The todo list ETag is the user's todos_version. It is kept in memory, so
+# answering "304 Not Modified" needs no SQL at all. Writes made by this
+# process drop the cached value right away; writes made by other worker
+# processes are noticed within TODO_VERSION_TTL seconds.
+
+_todo_versions = {}     # user_id -> (todos_version, time fetched)
+_todo_generations = {}  # user_id -> bumped by todos_changed(), so a version read across a write isn't kept
+_todo_versions_lock = threading.Lock()
+
+def todo_list_etag(user_id):
+    with _todo_versions_lock:
+        cached = _todo_versions.get(user_id)
+        generation = _todo_generations.get(user_id, 0)
+    if cached and time.monotonic() - cached[1] < TODO_VERSION_TTL:
+        return f'{user_id}-{cached[0]}'
+
+    version = db.session.query(User.todos_version).filter_by(id=user_id).scalar()
+    with _todo_versions_lock:
+        if generation == _todo_generations.get(user_id, 0):
+            _todo_versions[user_id] = (version, time.monotonic())
+    return f'{user_id}-{version}'
+
+def todos_changed(user_id, event=None, data='{}'):
+    """
+    Call after committing any write to a user's todos.
+    `event` and its JSON `data` are sent to the user's open streams.
+    """
+    with _todo_versions_lock:
+        _todo_versions.pop(user_id, None)
+        _todo_generations[user_id] = _todo_generations.get(user_id, 0) + 1
+    stats_changed()
+    if event:
+        publish(user_id, event, data)
+
+
+def encode_cursor(created_at, todo_id):
+    raw = json.dumps([created_at.isoformat(), todo_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor):
+    """Returns (created_at, id), or None if the cursor is not valid."""
+    try:
+        created_at, todo_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(todo_id)
+    except (ValueError, TypeError):
+        return None
+
+def encode_search_cursor(score, todo_id):
+    return base64.urlsafe_b64encode(json.dumps([score, todo_id]).encode()).decode()
+
+def decode_search_cursor(cursor):
+    """Returns (score, id), or None if the cursor is not valid."""
+    try:
+        score, todo_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), int(todo_id)
+    except (ValueError, TypeError):
+        return None
+
 
 @app.route('/api/todos', methods=['GET'])
 def get_todos():
@@ -397,8 +522,155 @@ def get_todos():
     if error:
         return error
 
-    todos = Todo.query.filter_by(user_id=current_user.id).all()
-    return jsonify({'todos': [todo.to_dict() for todo in todos]})
+    status = request.args.get('status')  # completed or pending
+    limit = request.args.get('limit', TODO_PAGE_SIZE, type=int)
+    limit = min(max(limit, 1), TODO_MAX_PAGE_SIZE)
+
+    query = db.select(*TODO_COLUMNS).where(Todo.user_id == current_user.id)
+
+    if status == 'completed':
+        query = query.filter_by(is_completed=True)
+    elif status == 'pending':
+        query = query.filter_by(is_completed=False)
+    elif status:
+        return jsonify({'error': 'status must be completed or pending'}), 400
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.where(db.tuple_(Todo.created_at, Todo.id) > after)
+
+    # Nothing changed since the client's copy: answer without touching todos.
+    # If-None-Match uses the weak comparison (RFC 7232), so the ETag still
+    # matches after a proxy that compresses the body has weakened it.
+    etag = todo_list_etag(current_user.id)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    # Plain column tuples straight to JSON bytes, no Todo objects.
+    # One extra row tells us whether there is a next page.
+    rows = db.session.execute(
+        query.order_by(Todo.created_at, Todo.id).limit(limit + 1)
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    response = Response(todos_json(rows, extra={'next_cursor': next_cursor}),
+                        mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'  # Always revalidate
+    return response
+
+
+@app.route('/api/todos/changes', methods=['GET'])
+def get_todo_changes():
+    """Todos written and ids deleted since ?since=<version> from an earlier call."""
+    current_user, error = get_current_user()
+    if error:
+        return error
+
+    since = request.args.get('since', 0, type=int)
+
+    # Read the version first: anything written after this shows up again
+    # next time, which is harmless since clients apply changes by id
+    version, sync_floor = db.session.execute(
+        db.select(User.todos_version, User.sync_floor).where(User.id == current_user.id)
+    ).one()
+
+    # No version yet, or the tombstones it needs were pruned: send everything
+    reset = since <= 0 or since < sync_floor
+    query = db.select(*TODO_COLUMNS).where(Todo.user_id == current_user.id)
+    if reset:
+        rows = db.session.execute(query.order_by(Todo.created_at, Todo.id)).all()
+        deleted = []
+    else:
+        rows = db.session.execute(
+            query.where(Todo.change_version > since).order_by(Todo.change_version)
+        ).all()
+        # SQLite may reuse the id of a deleted todo; the live row wins
+        changed_ids = {row.id for row in rows}
+        deleted = [todo_id for todo_id in db.session.scalars(
+            db.select(TodoTombstone.todo_id)
+            .where(TodoTombstone.user_id == current_user.id, TodoTombstone.version > since)
+            .order_by(TodoTombstone.version)
+        ) if todo_id not in changed_ids]
+
+    return Response(todos_json(rows, extra={'deleted': deleted, 'version': version, 'reset': reset}),
+                    mimetype='application/json')
+
+
+@app.route('/api/todos/search', methods=['GET'])
+def search_user_todos():
+    """The current user's todos containing every word of ?q=, best match first."""
+    current_user, error = get_current_user()
+    if error:
+        return error
+
+    if not search_available():
+        return jsonify({'error': 'Search is not available (SQLite was built without FTS5)'}), 501
+
+    match = search_match(current_user.id, request.args.get('q', ''))
+    if not match:
+        return jsonify({'error': 'q required'}), 400
+
+    limit = request.args.get('limit', TODO_PAGE_SIZE, type=int)
+    limit = min(max(limit, 1), TODO_MAX_PAGE_SIZE)
+
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        after = decode_search_cursor(cursor)
+        if not after:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    rows = search_todos(match, limit + 1, after)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_search_cursor(rows[-1].score, rows[-1].id)
+
+    return Response(todos_json([row[:5] for row in rows], extra={'next_cursor': next_cursor}),
+                    mimetype='application/json')
+
+
+@app.route('/api/todos/stream', methods=['GET'])
+def stream_todos():
+    """Server-Sent Events for writes to the current user's todos."""
+    current_user, error = get_current_user(allow_query_token=True)
+    if error:
+        return error
+    user_id = current_user.id
+
+    def events():
+        # Subscribing here (not before) means a stream that is never
+        # started can't leave a subscriber behind
+        subscriber = subscribe(user_id)
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        try:
+            yield 'retry: 3000\n\n'
+            while time.monotonic() < deadline:
+                item = subscriber.next()
+                if item is None:
+                    yield ': keepalive\n\n'
+                else:
+                    yield 'event: %s\ndata: %s\n\n' % item
+        except Dropped:
+            yield 'event: reset\ndata: {}\n\n'
+        finally:
+            unsubscribe(subscriber)
+
+    response = Response(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let a proxy buffer the stream
+    return response
 
 
 @app.route('/api/todos', methods=['POST'])
@@ -415,29 +687,181 @@ def create_todo():
 
     db.session.add(todo)
     db.session.commit()
+    todos_changed(current_user.id, 'created', json.dumps(todo.to_dict()))
 
     return jsonify(todo.to_dict()), 201
 
 
+def validate_todo(item):
+    """Returns an error message for one todo of a bulk request, or None."""
+    if not isinstance(item, dict):
+        return 'Each todo must be an object'
+    content = item.get('task_content')
+    if not isinstance(content, str) or not content.strip():
+        return 'task_content required'
+    if len(content) > Todo.task_content.type.length:
+        return f'task_content longer than {Todo.task_content.type.length} characters'
+    if not isinstance(item.get('is_completed', False), bool):
+        return 'is_completed must be true or false'
+    return None
+
+
+@app.route('/api/todos/bulk', methods=['POST'])
+def create_todos_bulk():
+    current_user, error = get_current_user()
+    if error:
+        return error
+
+    items = (request.get_json() or {}).get('todos')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'todos must be a non-empty list'}), 400
+    if len(items) > BULK_MAX_TODOS:
+        return jsonify({'error': f'At most {BULK_MAX_TODOS} todos per request'}), 400
+
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        message = validate_todo(item)
+        if message:
+            errors.append({'index': index, 'error': message})
+        else:
+            rows.append({
+                'task_content': item['task_content'],
+                'is_completed': item.get('is_completed', False),
+                'user_id': current_user.id
+            })
+
+    if not rows:
+        return jsonify({'created': [], 'errors': errors}), 400
+
+    # One executemany (sent as multi-row INSERT ... RETURNING id) and one commit.
+    # SQLite gives new rows increasing ids in insertion order, so the sorted ids
+    # line up with the input order.
+    ids = sorted(db.session.execute(db.insert(Todo).returning(Todo.id), rows).scalars())
+    db.session.commit()
+    todos_changed(current_user.id, 'changed')
+
+    return jsonify({'created': ids, 'errors': errors}), 201
+
+
+def bulk_conditions(user_id):
+    """
+    WHERE conditions for the bulk PUT/DELETE, from ?status= and ?ids=1,2,3.
+    Touching every todo of the user needs an explicit ?all=1, so a request
+    that lost its filter can't wipe the whole list.
+    Ownership is part of the WHERE clause, so no rows are loaded to check it.
+    Returns (conditions, error_response).
+    """
+    conditions = [Todo.user_id == user_id]
+
+    status = request.args.get('status')
+    if status == 'completed':
+        conditions.append(Todo.is_completed == True)
+    elif status == 'pending':
+        conditions.append(Todo.is_completed == False)
+    elif status:
+        return None, (jsonify({'error': 'status must be completed or pending'}), 400)
+
+    ids = request.args.get('ids')
+    if ids:
+        try:
+            conditions.append(Todo.id.in_([int(i) for i in ids.split(',')]))
+        except ValueError:
+            return None, (jsonify({'error': 'ids must be a comma separated list of numbers'}), 400)
+
+    if len(conditions) == 1 and not request.args.get('all', 0, type=int):
+        return None, (jsonify({'error': 'Give status or ids, or all=1 for every todo'}), 400)
+
+    return conditions, None
+
+
+@app.route('/api/todos/bulk', methods=['PUT'])
+def update_todos_bulk():
+    current_user, error = get_current_user()
+    if error:
+        return error
+
+    conditions, error = bulk_conditions(current_user.id)
+    if error:
+        return error
+
+    data = request.get_json() or {}
+    if not isinstance(data.get('is_completed'), bool):
+        return jsonify({'error': 'is_completed must be true or false'}), 400
+
+    # One UPDATE ... WHERE user_id = ? AND ...; rows already in that state are skipped
+    result = db.session.execute(
+        db.update(Todo)
+        .where(*conditions, Todo.is_completed != data['is_completed'])
+        .values(is_completed=data['is_completed'])
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    todos_changed(current_user.id, 'changed' if result.rowcount else None)
+
+    return jsonify({'updated': result.rowcount})
+
+
+@app.route('/api/todos/bulk', methods=['DELETE'])
+def delete_todos_bulk():
+    current_user, error = get_current_user()
+    if error:
+        return error
+
+    conditions, error = bulk_conditions(current_user.id)
+    if error:
+        return error
+
+    result = db.session.execute(
+        db.delete(Todo).where(*conditions).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    todos_changed(current_user.id, 'changed' if result.rowcount else None)
+
+    return jsonify({'deleted': result.rowcount})
+
+
+# Update and delete put the ownership check into the statement itself:
+# "... WHERE id = ? AND user_id = ?". Only when that matches nothing do we
+# run one more query to tell "no such todo" (404) from "not yours" (403).
+
+def not_found_or_forbidden(todo_id):
+    if db.session.query(Todo.id).filter_by(id=todo_id).first() is None:
+        abort(404)
+    return jsonify({'error': 'Not authorized'}), 403
+
+
+def todo_response(row):
+    return Response(todo_row_json(row) + '\n', mimetype='application/json')
+
+
 @app.route('/api/todos/<int:todo_id>', methods=['PUT'])
 def update_todo(todo_id):
     current_user, error = get_current_user()
     if error:
         return error
 
-    todo = Todo.query.get_or_404(todo_id)
+    data = request.get_json()
+    values = {key: data[key] for key in ('task_content', 'is_completed') if key in data}
+    owned = (Todo.id == todo_id, Todo.user_id == current_user.id)
 
-    if todo.user_id != current_user.id:
-        return jsonify({'error': 'Not authorized'}), 403
+    if not values:
+        row = db.session.execute(db.select(*TODO_COLUMNS).where(*owned)).first()
+        return todo_response(row) if row else not_found_or_forbidden(todo_id)
 
-    data = request.get_json()
-    if 'task_content' in data:
-        todo.task_content = data['task_content']
-    if 'is_completed' in data:
-        todo.is_completed = data['is_completed']
+    update = db.update(Todo).where(*owned).values(**values)
+    if db.engine.dialect.update_returning:
+        # SQLite 3.35+: update and read back the row in one statement
+        row = db.session.execute(update.returning(*TODO_COLUMNS)).first()
+    else:
+        updated = db.session.execute(update).rowcount
+        row = db.session.execute(db.select(*TODO_COLUMNS).where(*owned)).first() if updated else None
+
+    if row is None:
+        return not_found_or_forbidden(todo_id)
 
     db.session.commit()
-    return jsonify(todo.to_dict())
+    todos_changed(current_user.id, 'updated', todo_row_json(row))
+    return todo_response(row)
 
 
 @app.route('/api/todos/<int:todo_id>', methods=['DELETE'])
@@ -446,14 +870,14 @@ def delete_todo(todo_id):
     if error:
         return error
 
-    todo = Todo.query.get_or_404(todo_id)
-
-    if todo.user_id != current_user.id:
-        return jsonify({'error': 'Not authorized'}), 403
+    result = db.session.execute(
+        db.delete(Todo).where(Todo.id == todo_id, Todo.user_id == current_user.id)
+    )
+    if result.rowcount == 0:
+        return not_found_or_forbidden(todo_id)
 
-    db.session.delete(todo)
     db.session.commit()
-
+    todos_changed(current_user.id, 'deleted', json.dumps({'id': todo_id}))
     return jsonify({'message': 'Todo deleted'})
 
 
@@ -461,14 +885,78 @@ def delete_todo(todo_id):
 # ADMIN API
 # ============================================
 
+def keyset_batches(query, id_column, to_json):
+    """
+    Runs `query` in id order, STREAM_BATCH_SIZE rows at a time, and yields each
+    batch as a list of JSON strings. Every batch is a separate, finished query,
+    so no read lock is held on todo.db while the client downloads.
+    """
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            query.where(id_column > last_id).order_by(id_column).limit(STREAM_BATCH_SIZE)
+        ).all()
+        if rows:
+            yield [to_json(row) for row in rows]
+        if len(rows) < STREAM_BATCH_SIZE:
+            return
+        last_id = rows[-1][0]
+
+
+def stream_json_list(key, batches):
+    """
+    Streams b'{"<key>": [...]}' one batch at a time. Memory use is one batch,
+    whatever the row count, and the first bytes go out before any query runs.
+    """
+    def generate():
+        yield '{"%s":[' % key
+        separator = ''
+        for batch in batches:
+            yield separator + ','.join(batch)
+            separator = ','
+        yield ']}\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def page_args():
+    """Read ?page= and ?per_page= (1-based page, capped page size)."""
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = request.args.get('per_page', ADMIN_PAGE_SIZE, type=int)
+    return page, min(max(per_page, 1), ADMIN_MAX_PAGE_SIZE)
+
+
 @app.route('/api/admin/users', methods=['GET'])
 def get_all_users():
     current_user, error = get_admin_user()
     if error:
         return error
 
-    users = User.query.all()
-    return jsonify({'users': [user.to_dict_with_stats() for user in users]})
+    # Every user, streamed (for exports)
+    if request.args.get('stream', 0, type=int):
+        return stream_json_list('users', keyset_batches(
+            db.select(*USER_STATS_COLUMNS), User.id, user_stats_row_json))
+
+    return jsonify(users_page(*page_args()))
+
+
+def users_page(page, per_page):
+    # Todo counts are stored on the user row, so this is one plain query.
+    # One extra row tells us whether another page exists.
+    users = (
+        User.query
+        .order_by(User.id)
+        .limit(per_page + 1)
+        .offset((page - 1) * per_page)
+        .all()
+    )
+
+    return {
+        'users': [user.to_dict_with_stats() for user in users[:per_page]],
+        'page': page,
+        'per_page': per_page,
+        'has_more': len(users) > per_page
+    }
 
 
 @app.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
@@ -482,8 +970,11 @@ def delete_user(user_id):
 
     user = User.query.get_or_404(user_id)
     Todo.query.filter_by(user_id=user_id).delete()
+    TodoTombstone.query.filter_by(user_id=user_id).delete()  # Written by the delete above
     db.session.delete(user)
     db.session.commit()
+    invalidate_user(user_id, token_version=None)
+    todos_changed(user_id)
 
     return jsonify({'message': f'User {user.username} deleted'})
 
@@ -504,7 +995,9 @@ def promote_user(user_id):
         return jsonify({'message': 'User is already an admin'})
 
     user.is_admin = True
+    bump_token_version(user)  # Old tokens still say is_admin=False
     db.session.commit()
+    invalidate_user(user_id, user.token_version)
 
     return jsonify({'message': f'User {user.username} promoted to admin'})
 
@@ -519,20 +1012,74 @@ def recent_activity():
     if error:
         return error
 
-    todos = (
-        Todo.query
+    # Owner names come from the join, not from one todo.user lookup per todo
+    rows = db.session.execute(
+        db.select(*TODO_COLUMNS, User.username)
+        .join(User, User.id == Todo.user_id)
         .order_by(Todo.created_at.desc())
         .limit(10)
-        .all()
-    )
-
-    result = []
-    for todo in todos:
-        data = todo.to_dict()
-        data['username'] = todo.user.username
-        result.append(data)
+    ).all()
+
+    return Response(todos_json(rows, key='recent_todos', row_json=admin_todo_row_json),
+                    mimetype='application/json')
+
+
+# Stats are cached for STATS_TTL seconds and dropped by stats_changed() on
+# every user or todo write in this process. When the cache is empty only one
+# request recomputes it; requests arriving meanwhile wait for that result
+# instead of all running the same query.
+
+_stats = None            # (stats, time computed)
+_stats_generation = 0    # Bumped by stats_changed(), so a result computed across a write isn't kept
+_stats_lock = threading.Lock()
+_stats_refresh_lock = threading.Lock()
+
+def stats_changed():
+    """Call after committing a write that changes user or todo counts."""
+    global _stats, _stats_generation
+    with _stats_lock:
+        _stats = None
+        _stats_generation += 1
+
+def _cached_stats():
+    with _stats_lock:
+        if _stats and time.monotonic() - _stats[1] < STATS_TTL:
+            return _stats[0]
+    return None
+
+def admin_stats():
+    global _stats
+    stats = _cached_stats()
+    if stats:
+        return stats
+
+    with _stats_refresh_lock:
+        # Another request may have filled the cache while we waited
+        stats = _cached_stats()
+        if stats:
+            return stats
+
+        with _stats_lock:
+            generation = _stats_generation
+
+        # Conditional aggregation would still scan todos; summing the
+        # per-user counters is one pass over the (much smaller) users table
+        total_users, total_todos, completed_todos = db.session.query(
+            db.func.count(User.id),
+            db.func.coalesce(db.func.sum(User.total_todos), 0),
+            db.func.coalesce(db.func.sum(User.completed_todos), 0)
+        ).one()
+        stats = {
+            'total_users': total_users,
+            'total_todos': total_todos,
+            'completed_todos': completed_todos,
+            'pending_todos': total_todos - completed_todos
+        }
 
-    return jsonify({'recent_todos': result})
+        with _stats_lock:
+            if generation == _stats_generation:
+                _stats = (stats, time.monotonic())
+        return stats
 
 
 @app.route('/api/admin/stats', methods=['GET'])
@@ -541,16 +1088,47 @@ def get_stats():
     if error:
         return error
 
-    total_users = User.query.count()
-    total_todos = Todo.query.count()
-    completed_todos = Todo.query.filter_by(is_completed=True).count()
-
-    return jsonify({
-        'total_users': total_users,
-        'total_todos': total_todos,
-        'completed_todos': completed_todos,
-        'pending_todos': total_todos - completed_todos
-    })
+    return jsonify(admin_stats())
+
+
+def admin_todos_query():
+    """
+    All todos with their owner's username, filtered by ?user_id=, ?status=
+    (completed or pending), ?from= and ?to= (ISO dates, a plain ?to= date
+    includes that whole day). Returns (query, error_response).
+    """
+    query = db.select(*TODO_COLUMNS, User.username).join(User, User.id == Todo.user_id)
+
+    user_id = request.args.get('user_id')
+    if user_id:
+        if not user_id.isdigit():
+            return None, (jsonify({'error': 'user_id must be a number'}), 400)
+        query = query.where(Todo.user_id == int(user_id))
+
+    status = request.args.get('status')
+    if status == 'completed':
+        query = query.where(Todo.is_completed == True)
+    elif status == 'pending':
+        query = query.where(Todo.is_completed == False)
+    elif status:
+        return None, (jsonify({'error': 'status must be completed or pending'}), 400)
+
+    for name in ('from', 'to'):
+        value = request.args.get(name)
+        if not value:
+            continue
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            return None, (jsonify({'error': f'{name} must be an ISO date'}), 400)
+        if name == 'from':
+            query = query.where(Todo.created_at >= moment)
+        else:
+            if len(value) == 10:
+                moment += timedelta(days=1)
+            query = query.where(Todo.created_at < moment)
+
+    return query, None
 
 
 @app.route('/api/admin/todos', methods=['GET'])
@@ -559,13 +1137,86 @@ def get_all_todos():
     if error:
         return error
 
-    todos = Todo.query.all()
-    result = []
-    for todo in todos:
-        todo_data = todo.to_dict()
-        todo_data['username'] = todo.user.username
-        result.append(todo_data)
-    return jsonify({'todos': result})
+    query, error = admin_todos_query()
+    if error:
+        return error
+
+    if request.args.get('stream', 0, type=int):
+        return stream_json_list('todos', keyset_batches(query, Todo.id, admin_todo_row_json))
+
+    return Response(todos_page_json(query, *page_args()), mimetype='application/json')
+
+
+def todos_page_json(query, page, per_page):
+    # One query whatever the page size: owners are joined in, and
+    # one extra row tells us whether another page exists
+    rows = db.session.execute(
+        query.order_by(Todo.id).limit(per_page + 1).offset((page - 1) * per_page)
+    ).all()
+
+    return todos_json(rows[:per_page], row_json=admin_todo_row_json,
+                      extra={'page': page, 'per_page': per_page, 'has_more': len(rows) > per_page})
+
+
+# Everything the admin page shows first, in one request: the admin check
+# runs once, and the three parts run at the same time on their own threads,
+# each in its own app context (so its own session and database connection).
+
+_overview_pool = ThreadPoolExecutor(max_workers=OVERVIEW_WORKERS, thread_name_prefix='overview')
+
+def in_app_context(func, *args):
+    with app.app_context():
+        return func(*args)
+
+
+@app.route('/api/admin/overview', methods=['GET'])
+def admin_overview():
+    current_user, error = get_admin_user()
+    if error:
+        return error
+
+    # Request arguments can only be read here, not on the pool threads
+    todos_query, error = admin_todos_query()
+    if error:
+        return error
+
+    stats = _overview_pool.submit(in_app_context, admin_stats)
+    users = _overview_pool.submit(in_app_context, users_page, 1, ADMIN_PAGE_SIZE)
+    todos = _overview_pool.submit(in_app_context, todos_page_json, todos_query, 1, ADMIN_PAGE_SIZE)
+
+    body = '{"stats":%s,"todos":%s,"users":%s}\n' % (
+        json.dumps(stats.result(), sort_keys=True),
+        todos.result().decode().rstrip('\n'),
+        json.dumps(users.result(), sort_keys=True)
+    )
+    return Response(body, mimetype='application/json')
+
+
+# ============================================
+# CLI
+# ============================================
+
+@app.cli.command('repair-counters')
+def repair_counters_command():
+    """Recompute the per-user todo counters from the todos table."""
+    repair_todo_counters()
+    print('Todo counters repaired')
+
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Rebuild the full-text search index from the todos table."""
+    if not search_available():
+        print('SQLite was built without FTS5, search is not available')
+        return
+    rebuild_search_index()
+    print('Search index rebuilt')
+
+
+@app.cli.command('prune-tombstones')
+def prune_tombstones_command():
+    """Delete tombstones older than the retention period."""
+    print(f'{prune_tombstones()} tombstones pruned')
 
 
 if __name__ == '__main__':
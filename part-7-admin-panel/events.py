@@ -0,0 +1,75 @@
+# =============================================================================
+# Part 7: Live Todo Events
+# =============================================================================
+# The todo write routes publish "created" / "updated" / "deleted" events here,
+# and GET /api/todos/stream passes them on to the browser (Server-Sent Events).
+#
+# Every open stream has its own small queue. Publishing never waits: if a
+# stream has fallen QUEUE_SIZE events behind it is dropped, and the browser
+# reconnects and reloads the list.
+#
+# Subscribers live in this process only. With several workers, a stream only
+# sees writes handled by its own worker; the delta sync endpoint covers the rest.
+
+import threading
+from collections import deque
+
+QUEUE_SIZE = 100            # Events a stream may fall behind before it is dropped
+KEEPALIVE_SECONDS = 15      # Comment line sent when idle (also notices closed connections)
+
+
+class Subscriber:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.events = deque()
+        self.dropped = False
+        self.ready = threading.Condition()
+
+    def push(self, event):
+        """Queue an event. Returns False if the subscriber is too far behind."""
+        with self.ready:
+            if len(self.events) >= QUEUE_SIZE:
+                self.dropped = True
+            else:
+                self.events.append(event)
+            self.ready.notify()
+        return not self.dropped
+
+    def next(self, timeout=KEEPALIVE_SECONDS):
+        """The next (event, data), None after `timeout` seconds, or raises Dropped."""
+        with self.ready:
+            self.ready.wait_for(lambda: self.events or self.dropped, timeout)
+            if self.dropped:
+                raise Dropped()
+            return self.events.popleft() if self.events else None
+
+
+class Dropped(Exception):
+    pass
+
+
+_subscribers = {}   # user_id -> set of Subscriber
+_lock = threading.Lock()
+
+
+def subscribe(user_id):
+    subscriber = Subscriber(user_id)
+    with _lock:
+        _subscribers.setdefault(user_id, set()).add(subscriber)
+    return subscriber
+
+def unsubscribe(subscriber):
+    with _lock:
+        subscribers = _subscribers.get(subscriber.user_id)
+        if subscribers:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del _subscribers[subscriber.user_id]
+
+def publish(user_id, event, data):
+    """Send an event to all of a user's streams. `data` is a JSON string."""
+    with _lock:
+        subscribers = list(_subscribers.get(user_id, ()))
+    for subscriber in subscribers:
+        if not subscriber.push((event, data)):
+            unsubscribe(subscriber)
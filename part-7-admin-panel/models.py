@@ -1,10 +1,15 @@
+import json
+
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy.schema import CreateColumn, CreateTable
+from datetime import datetime, timedelta
 
 db = SQLAlchemy()
 
 class User(db.Model):
     __tablename__ = 'users'
+    # Never hand a deleted user's id to a new user: their old tokens carry it
+    __table_args__ = {'sqlite_autoincrement': True}
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -12,6 +17,15 @@ class User(db.Model):
     password_hash = db.Column(db.String(256), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)  # NEW: Admin flag
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped to invalidate all tokens issued to this user so far
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Kept up to date by the todos triggers below
+    total_todos = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    completed_todos = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped by a trigger on every write to this user's todos (used as ETag)
+    todos_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Tombstones up to this version have been pruned (see prune_tombstones)
+    sync_floor = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     todos = db.relationship('Todo', backref='user', lazy=True)
 
@@ -26,27 +40,37 @@ class User(db.Model):
 
     # NEW: For admin panel - include user statistics
     def to_dict_with_stats(self):
-        total_todos = len(self.todos)
-        completed_todos = len([t for t in self.todos if t.is_completed])
         return {
             'id': self.id,
             'username': self.username,
             'email': self.email,
             'is_admin': self.is_admin,
             'created_at': self.created_at.isoformat(),
-            'total_todos': total_todos,
-            'completed_todos': completed_todos
+            'total_todos': self.total_todos,
+            'completed_todos': self.completed_todos
         }
 
 
 class Todo(db.Model):
     __tablename__ = 'todos'
+    __table_args__ = (
+        # A user's todos, optionally by status, in creation order
+        # (SQLite appends the id to every index, so both also cover (created_at, id))
+        db.Index('ix_todos_user_completed_created', 'user_id', 'is_completed', 'created_at'),
+        db.Index('ix_todos_user_created', 'user_id', 'created_at'),
+        # Newest todos across all users (admin recent activity)
+        db.Index('ix_todos_created_at', 'created_at'),
+        # A user's todos changed since a version (delta sync)
+        db.Index('ix_todos_user_change_version', 'user_id', 'change_version'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     task_content = db.Column(db.String(200), nullable=False)
     is_completed = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # The owner's todos_version after the last write to this todo (set by trigger)
+    change_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def to_dict(self):
         return {
@@ -56,3 +80,333 @@ class Todo(db.Model):
             'created_at': self.created_at.isoformat(),
             'user_id': self.user_id
         }
+
+
+# =============================================================================
+# FAST TODO SERIALIZATION
+# =============================================================================
+# List endpoints select just these columns as plain tuples (no ORM objects)
+# and turn them into JSON bytes with a fixed template. The output is the same
+# as jsonify() of Todo.to_dict(): sorted keys, ASCII-only strings.
+
+TODO_COLUMNS = (Todo.id, Todo.task_content, Todo.is_completed, Todo.created_at, Todo.user_id)
+
+_TODO_TEMPLATE = '{"created_at":%s,"id":%d,"is_completed":%s,"task_content":%s,"user_id":%d}'
+_encode_str = json.encoder.encode_basestring_ascii
+
+def todo_row_json(row):
+    todo_id, task_content, is_completed, created_at, user_id = row
+    return _TODO_TEMPLATE % (
+        _encode_str(created_at.isoformat()) if created_at else 'null',
+        todo_id,
+        'true' if is_completed else 'false',
+        _encode_str(task_content),
+        user_id
+    )
+
+def admin_todo_row_json(row):
+    """todo_row_json() of the first five columns plus the owner's "username" (sixth)."""
+    return todo_row_json(row[:5])[:-1] + ',"username":%s}' % _encode_str(row[5])
+
+def todos_json(rows, key='todos', extra=None, row_json=todo_row_json):
+    """Serialize TODO_COLUMNS rows to b'{"<key>": [...]}', plus any extra fields."""
+    fields = {key: '[%s]' % ','.join(map(row_json, rows))}
+    for name, value in (extra or {}).items():
+        fields[name] = json.dumps(value)
+    body = ','.join('"%s":%s' % (name, fields[name]) for name in sorted(fields))
+    return ('{%s}\n' % body).encode()
+
+
+USER_STATS_COLUMNS = (User.id, User.username, User.email, User.is_admin, User.created_at,
+                      User.total_todos, User.completed_todos)
+
+def user_stats_row_json(row):
+    """Same fields as User.to_dict_with_stats(), from a USER_STATS_COLUMNS row."""
+    user = row._asdict()
+    user['created_at'] = user['created_at'].isoformat()
+    return json.dumps(user, sort_keys=True, separators=(',', ':'))
+
+
+# Logged-out tokens, kept until the token would have expired anyway
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(32), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+# One row per deleted todo, so delta sync can tell clients what went away
+class TodoTombstone(db.Model):
+    __tablename__ = 'todo_tombstones'
+    __table_args__ = (
+        db.Index('ix_todo_tombstones_user_version', 'user_id', 'version'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    todo_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+# =============================================================================
+# SCHEMA UPGRADES
+# =============================================================================
+# db.create_all() only creates missing tables. Columns and indexes added to a
+# model later are added here, so an existing todo.db keeps its data.
+
+def upgrade_db():
+    inspector = db.inspect(db.engine)
+    added = set()
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+                    conn.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {ddl}'))
+                    added.add(f'{table.name}.{column.name}')
+
+            # CREATE INDEX works on the existing table, no rebuild needed
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+        for name in DROPPED_TRIGGERS:
+            conn.execute(db.text(f'DROP TRIGGER IF EXISTS {name}'))
+        for trigger in TRIGGERS:
+            conn.execute(db.text(trigger))
+
+    _rebuild_users_autoincrement()
+
+    if 'users.total_todos' in added:
+        repair_todo_counters()
+
+    create_search_index()
+
+
+def _rebuild_users_autoincrement():
+    """
+    Without AUTOINCREMENT, SQLite gives the id of the newest deleted user to
+    the next new one, and the deleted user's tokens would log in as them.
+    SQLite can't add AUTOINCREMENT to a table, so copy users into a new one.
+    """
+    with db.engine.connect() as conn:
+        sql = conn.execute(db.text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'users'")).scalar()
+        if 'AUTOINCREMENT' in sql.upper():
+            return
+
+        ddl = str(CreateTable(User.__table__).compile(dialect=db.engine.dialect))
+        ddl = ddl.replace('CREATE TABLE users ', 'CREATE TABLE users_new ', 1)
+        columns = ', '.join(column.name for column in User.__table__.columns)
+
+        # The todos triggers mention users; legacy mode lets the rename through
+        conn.exec_driver_sql('PRAGMA legacy_alter_table = ON')
+        try:
+            conn.execute(db.text('DROP TABLE IF EXISTS users_new'))
+            conn.execute(db.text(ddl))
+            conn.execute(db.text(f'INSERT INTO users_new ({columns}) SELECT {columns} FROM users'))
+            conn.execute(db.text('DROP TABLE users'))
+            conn.execute(db.text('ALTER TABLE users_new RENAME TO users'))
+            conn.commit()
+        finally:
+            conn.exec_driver_sql('PRAGMA legacy_alter_table = OFF')
+
+
+# =============================================================================
+# TODO COUNTERS
+# =============================================================================
+# users.total_todos / completed_todos / todos_version are changed by triggers
+# in the same transaction as the todo write, so every way of writing todos
+# (ORM, bulk statements, deleting a user's todos) keeps them right.
+
+TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_count_insert AFTER INSERT ON todos BEGIN
+        UPDATE users SET total_todos = total_todos + 1,
+                         completed_todos = completed_todos + (NEW.is_completed IS 1)
+        WHERE id = NEW.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_count_delete AFTER DELETE ON todos BEGIN
+        UPDATE users SET total_todos = total_todos - 1,
+                         completed_todos = completed_todos - (OLD.is_completed IS 1)
+        WHERE id = OLD.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_count_update AFTER UPDATE OF is_completed, user_id ON todos BEGIN
+        UPDATE users SET total_todos = total_todos - 1,
+                         completed_todos = completed_todos - (OLD.is_completed IS 1)
+        WHERE id = OLD.user_id;
+        UPDATE users SET total_todos = total_todos + 1,
+                         completed_todos = completed_todos + (NEW.is_completed IS 1)
+        WHERE id = NEW.user_id;
+    END
+    """,
+    # users.todos_version changes whenever anything in the user's todo list does.
+    # The same trigger stamps the todo with the new version (or records a
+    # tombstone), since SQLite doesn't promise an order between triggers.
+    # The update trigger lists its columns so stamping change_version doesn't
+    # fire it again.
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_sync_insert AFTER INSERT ON todos BEGIN
+        UPDATE users SET todos_version = todos_version + 1 WHERE id = NEW.user_id;
+        UPDATE todos SET change_version = (SELECT todos_version FROM users WHERE id = NEW.user_id)
+        WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_sync_update
+    AFTER UPDATE OF task_content, is_completed, created_at, user_id ON todos BEGIN
+        UPDATE users SET todos_version = todos_version + 1 WHERE id IN (OLD.user_id, NEW.user_id);
+        UPDATE todos SET change_version = (SELECT todos_version FROM users WHERE id = NEW.user_id)
+        WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_sync_delete AFTER DELETE ON todos BEGIN
+        UPDATE users SET todos_version = todos_version + 1 WHERE id = OLD.user_id;
+        INSERT INTO todo_tombstones (todo_id, user_id, version, deleted_at)
+        SELECT OLD.id, OLD.user_id, todos_version, datetime('now') FROM users WHERE id = OLD.user_id;
+    END
+    """,
+]
+
+# Replaced by the todos_sync_* triggers above
+DROPPED_TRIGGERS = ['todos_version_insert', 'todos_version_update', 'todos_version_delete']
+
+
+def repair_todo_counters():
+    """Recompute every user's counters from the todos table."""
+    with db.engine.begin() as conn:
+        conn.execute(db.text("""
+            UPDATE users SET
+                total_todos = (SELECT COUNT(*) FROM todos WHERE todos.user_id = users.id),
+                completed_todos = (SELECT COUNT(*) FROM todos
+                                   WHERE todos.user_id = users.id AND todos.is_completed = 1)
+        """))
+
+
+# =============================================================================
+# TOMBSTONE PRUNING
+# =============================================================================
+
+TOMBSTONE_RETENTION_DAYS = 30
+
+def prune_tombstones(retention_days=TOMBSTONE_RETENTION_DAYS):
+    """Drop old tombstones; clients that synced before them must start over."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    with db.engine.begin() as conn:
+        # Remember the newest pruned version per user before it is gone
+        conn.execute(db.text("""
+            UPDATE users SET sync_floor = (
+                SELECT MAX(version) FROM todo_tombstones
+                WHERE todo_tombstones.user_id = users.id AND deleted_at < :cutoff)
+            WHERE id IN (SELECT user_id FROM todo_tombstones WHERE deleted_at < :cutoff)
+        """), {'cutoff': cutoff})
+        result = conn.execute(db.delete(TodoTombstone).where(TodoTombstone.deleted_at < cutoff))
+    return result.rowcount
+
+
+# =============================================================================
+# FULL-TEXT SEARCH
+# =============================================================================
+# todos_fts is an FTS5 index over todos.task_content. It stores no text of its
+# own (content='todos'); triggers keep it in step with every todo write.
+# user_id is indexed too, so a search only walks the searching user's entries
+# instead of everyone's matches.
+
+_search_enabled = False   # Set by create_search_index(); stays False if SQLite lacks FTS5
+
+def search_available():
+    return _search_enabled
+
+SEARCH_TABLE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts
+    USING fts5(task_content, user_id, content='todos', content_rowid='id')
+"""
+
+SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_fts_insert AFTER INSERT ON todos BEGIN
+        INSERT INTO todos_fts (rowid, task_content, user_id)
+        VALUES (NEW.id, NEW.task_content, NEW.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_fts_delete AFTER DELETE ON todos BEGIN
+        INSERT INTO todos_fts (todos_fts, rowid, task_content, user_id)
+        VALUES ('delete', OLD.id, OLD.task_content, OLD.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_fts_update AFTER UPDATE OF task_content, user_id ON todos BEGIN
+        INSERT INTO todos_fts (todos_fts, rowid, task_content, user_id)
+        VALUES ('delete', OLD.id, OLD.task_content, OLD.user_id);
+        INSERT INTO todos_fts (rowid, task_content, user_id)
+        VALUES (NEW.id, NEW.task_content, NEW.user_id);
+    END
+    """,
+]
+
+
+def create_search_index():
+    """Create todos_fts and its triggers, filling it if todos already has rows."""
+    global _search_enabled
+    with db.engine.begin() as conn:
+        if not conn.execute(db.text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar():
+            return False
+        exists = conn.execute(db.text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'todos_fts'")).first()
+        conn.execute(db.text(SEARCH_TABLE))
+        for trigger in SEARCH_TRIGGERS:
+            conn.execute(db.text(trigger))
+    if not exists:
+        rebuild_search_index()
+    _search_enabled = True
+    return True
+
+
+def rebuild_search_index():
+    """Re-index every todo (e.g. after writing to todos with the triggers missing)."""
+    with db.engine.begin() as conn:
+        conn.execute(db.text("INSERT INTO todos_fts (todos_fts) VALUES ('rebuild')"))
+
+
+def search_match(user_id, text):
+    """
+    FTS5 query for todos of `user_id` containing every word of `text`.
+    Each word is quoted, so FTS5 operators typed by the user are just words.
+    Returns None if `text` has no words.
+    """
+    words = ' '.join('"%s"' % word.replace('"', '""') for word in text.split())
+    if not words:
+        return None
+    return f'user_id:"{user_id}" AND task_content:({words})'
+
+
+def search_todos(match, limit, after=None):
+    """
+    Rows of TODO_COLUMNS plus a score (lower is better), best first.
+    `after` is the (score, id) of the last row of the previous page.
+    """
+    # bm25() weights: the user_id column doesn't count towards relevance
+    after_clause = 'WHERE (score, id) > (:after_score, :after_id)' if after else ''
+    statement = db.text(f"""
+        SELECT * FROM (
+            SELECT todos.id, todos.task_content, todos.is_completed, todos.created_at,
+                   todos.user_id, bm25(todos_fts, 1.0, 0.0) AS score
+            FROM todos_fts JOIN todos ON todos.id = todos_fts.rowid
+            WHERE todos_fts MATCH :match
+        ) AS hits
+        {after_clause}
+        ORDER BY score, id
+        LIMIT :limit
+    """).columns(*TODO_COLUMNS, db.column('score', db.Float))
+    params = {'match': match, 'limit': limit}
+    if after:
+        params['after_score'], params['after_id'] = after
+    return db.session.execute(statement, params).all()
@@ -0,0 +1,113 @@
+# =============================================================================
+# Part 7: Token Revocation (logout)
+# =============================================================================
+# Revoked token IDs ("jti" claims) are stored in the revoked_tokens table.
+# Checking that table on every request would add a query to the hot path, so
+# an in-memory Bloom filter sits in front of it: a "no" from the filter is
+# certain, and only a "maybe" is confirmed with a query.
+
+import hashlib
+import threading
+import time
+from datetime import datetime
+
+from flask import has_app_context
+
+BLOOM_BITS = 1 << 20            # 128 KB of memory
+BLOOM_HASHES = 7
+SYNC_SECONDS = 5                # Pick up revocations made by other workers
+PRUNE_SECONDS = 600             # Delete rows whose token has expired
+
+
+class BloomFilter:
+    def __init__(self, bits=BLOOM_BITS, hashes=BLOOM_HASHES):
+        self.bits = bits
+        self.hashes = hashes
+        self.array = bytearray(bits // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.hashes).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[4 * i:4 * i + 4], 'little') % self.bits
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+_bloom = BloomFilter()
+_last_id = 0        # Highest revoked_tokens.id already in the filter
+_last_sync = 0.0
+_last_prune = 0.0
+_lock = threading.Lock()
+
+
+def load_revocations():
+    """Rebuild the filter from the table. Call at startup inside an app context."""
+    global _bloom, _last_id, _last_sync
+    from models import RevokedToken
+
+    bloom = BloomFilter()
+    last_id = 0
+    for row_id, jti in RevokedToken.query.with_entities(RevokedToken.id, RevokedToken.jti):
+        bloom.add(jti)
+        last_id = max(last_id, row_id)
+
+    with _lock:
+        _bloom, _last_id, _last_sync = bloom, last_id, time.time()
+
+
+def _sync():
+    global _last_id, _last_sync
+    from models import RevokedToken
+
+    rows = (RevokedToken.query
+            .with_entities(RevokedToken.id, RevokedToken.jti)
+            .filter(RevokedToken.id > _last_id)
+            .all())
+    with _lock:
+        for row_id, jti in rows:
+            _bloom.add(jti)
+            _last_id = max(_last_id, row_id)
+        _last_sync = time.time()
+
+
+def is_revoked(jti):
+    if has_app_context() and time.time() - _last_sync > SYNC_SECONDS:
+        _sync()
+
+    if jti not in _bloom:
+        return False
+
+    # Possible positive: confirm with the table
+    from models import RevokedToken
+    return RevokedToken.query.filter_by(jti=jti).first() is not None
+
+
+def revoke(jti, exp):
+    """Store a revoked token ID until the token would have expired anyway."""
+    from models import db, RevokedToken
+
+    if RevokedToken.query.filter_by(jti=jti).first() is None:
+        db.session.add(RevokedToken(jti=jti, expires_at=datetime.utcfromtimestamp(exp)))
+        db.session.commit()
+    _bloom.add(jti)
+
+    if time.time() - _last_prune > PRUNE_SECONDS:
+        prune_expired()
+
+
+def prune_expired():
+    """Delete revocations of tokens that have expired, then rebuild the filter."""
+    global _last_prune
+    from models import db, RevokedToken
+
+    _last_prune = time.time()
+    deleted = RevokedToken.query.filter(RevokedToken.expires_at < datetime.utcnow()).delete()
+    db.session.commit()
+    if deleted:
+        load_revocations()
+    return deleted
@@ -0,0 +1,119 @@
+# =============================================================================
+# Part 7: Login Throttling
+# =============================================================================
+# Every login attempt costs one slow password verify, so attempts are limited
+# per email and per client IP *before* the password is checked.
+#
+# Each key has a token bucket: BURST attempts right away, then RATE more per
+# minute. A bucket is just (tokens, last_update), so memory per key is O(1),
+# and the least recently used keys are dropped once MAX_KEYS is reached.
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# kind -> (burst, attempts per minute)
+LIMITS = {
+    'ip': (20, 20),
+    'email': (5, 5),
+}
+MAX_KEYS = 100000
+BACKEND = 'memory'   # 'memory' (per process) or 'sqlite' (shared by all workers)
+SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'throttle.db')
+
+
+def _refill(tokens, updated, now, burst, per_minute):
+    return min(burst, tokens + (now - updated) * per_minute / 60.0)
+
+
+def _retry_after(tokens, per_minute):
+    return (1 - tokens) * 60.0 / per_minute
+
+
+class MemoryBackend:
+    def __init__(self):
+        self.buckets = OrderedDict()  # key -> [tokens, updated], oldest first
+        self.lock = threading.Lock()
+
+    def hit(self, keys, now):
+        with self.lock:
+            states = []
+            for kind, key in keys:
+                burst, per_minute = LIMITS[kind]
+                tokens, updated = self.buckets.get(key, (burst, now))
+                states.append((key, _refill(tokens, updated, now, burst, per_minute), per_minute))
+
+            wait = max((_retry_after(t, rate) for _, t, rate in states if t < 1), default=0)
+            for key, tokens, _ in states:
+                self.buckets[key] = (tokens if wait else tokens - 1, now)
+                self.buckets.move_to_end(key)
+            while len(self.buckets) > MAX_KEYS:
+                self.buckets.popitem(last=False)
+            return wait
+
+
+class SqliteBackend:
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self.local = threading.local()
+        self.hits = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._conn() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_buckets_updated ON buckets (updated)')
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads
+        if not hasattr(self.local, 'conn'):
+            self.local.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        return self.local.conn
+
+    def hit(self, keys, now):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')  # Serializes workers on this file
+        try:
+            states = []
+            for kind, key in keys:
+                burst, per_minute = LIMITS[kind]
+                row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?',
+                                   (key,)).fetchone()
+                tokens, updated = row or (burst, now)
+                states.append((key, _refill(tokens, updated, now, burst, per_minute), per_minute))
+
+            wait = max((_retry_after(t, rate) for _, t, rate in states if t < 1), default=0)
+            conn.executemany('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                             [(key, tokens if wait else tokens - 1, now) for key, tokens, _ in states])
+
+            self.hits += 1
+            if self.hits % 1000 == 0:
+                conn.execute('DELETE FROM buckets WHERE key IN '
+                             '(SELECT key FROM buckets ORDER BY updated DESC LIMIT -1 OFFSET ?)',
+                             (MAX_KEYS,))
+            conn.execute('COMMIT')
+            return wait
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def _get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = SqliteBackend() if BACKEND == 'sqlite' else MemoryBackend()
+        return _backend
+
+
+def check_login(email, ip):
+    """
+    Count one login attempt for this email and IP.
+    Returns 0 if the attempt may go ahead, else the seconds to wait.
+    """
+    keys = [('ip', f'ip:{ip}'), ('email', f'email:{(email or "").lower()}')]
+    return _get_backend().hit(keys, time.time())
@@ -1,15 +1,18 @@
 from flask import Flask, request, jsonify, render_template
-from models import db, User, Todo
-from auth import hash_password, verify_password, create_token, get_current_user
+from models import db, User, Todo, PRIORITIES, upgrade_db
+from auth import (hash_password, verify_password, create_token, get_current_user,
+                  configure_hashing, needs_rehash, rehash_in_background, HashingBusy)
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///todo.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db.init_app(app)
+configure_hashing()
 
 with app.app_context():
     db.create_all()
+    upgrade_db()
 
 
 # ============================================
@@ -47,10 +50,15 @@ def register():
     if User.query.filter_by(username=data['username']).first():
         return jsonify({'error': 'Username already taken'}), 400
 
+    try:
+        password_hash = hash_password(data['password'])
+    except HashingBusy:
+        return jsonify({'error': 'Server is busy, please try again'}), 503, {'Retry-After': '1'}
+
     user = User(
         username=data['username'],
         email=data['email'],
-        password_hash=hash_password(data['password'])
+        password_hash=password_hash
     )
 
     db.session.add(user)
@@ -65,9 +73,18 @@ def login():
 
     user = User.query.filter_by(email=data['email']).first()
 
-    if not user or not verify_password(data['password'], user.password_hash):
+    try:
+        password_ok = user and verify_password(data['password'], user.password_hash)
+    except HashingBusy:
+        return jsonify({'error': 'Server is busy, please try again'}), 503, {'Retry-After': '1'}
+
+    if not password_ok:
         return jsonify({'error': 'Invalid email or password'}), 401
 
+    # Upgrade hashes made with an older hashing policy
+    if needs_rehash(user.password_hash):
+        rehash_in_background(user.id, user.password_hash, data['password'])
+
     token = create_token(user.id)
 
     return jsonify({
@@ -95,7 +112,23 @@ def get_todos():
         return error
 
     # Step 2: Get user's todos
-    todos = Todo.query.filter_by(user_id=current_user.id).all()
+    query = Todo.query.filter_by(user_id=current_user.id)
+
+    # ?priority=high and ?sort=priority are both served by the
+    # (user_id, priority, created_at) index, no full scan or sort
+    priority = request.args.get('priority')
+    if priority:
+        if priority not in PRIORITIES:
+            return jsonify({'error': 'priority must be low, medium or high'}), 400
+        query = query.filter_by(priority=PRIORITIES[priority])
+
+    sort = request.args.get('sort')
+    if sort == 'priority':
+        query = query.order_by(Todo.priority, Todo.created_at)  # High first, then oldest first
+    elif sort:
+        return jsonify({'error': 'sort must be priority'}), 400
+
+    todos = query.all()
     return jsonify({'todos': [todo.to_dict() for todo in todos]})
 
 
@@ -108,13 +141,17 @@ def create_todo():
 
     # Step 2: Create todo
     data = request.get_json()
+    priority = data.get('priority', 'medium')
+    if priority not in PRIORITIES:
+        return jsonify({'error': 'priority must be low, medium or high'}), 400
+
     todo = Todo(
         task_content=data['task_content'],
         user_id=current_user.id,
         # ===========================================
         # HOMEWORK: Add this line below
         # ===========================================
-        priority=data.get('priority', 'medium')
+        priority=PRIORITIES[priority]
         # ===========================================
     )
 
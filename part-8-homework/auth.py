@@ -3,23 +3,150 @@
 # =============================================================================
 
 import jwt
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
 # Note: We don't need 'wraps' anymore since we're not using decorators
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 
 SECRET_KEY = 'your-secret-key-change-in-production'
+TOKEN_CACHE_SIZE = 1024  # Max verified tokens kept in memory
+
+# Password hashing runs in worker processes so a burst of logins
+# does not block the threads serving todo requests.
+HASH_WORKERS = 2            # 0 = hash inline on the request thread
+HASH_QUEUE_SIZE = 16        # Max hash jobs waiting or running at once
+HASH_TIMEOUT_SECONDS = 5
+
+# Hashing policy. Stored hashes weaker than the policy are upgraded the
+# next time their owner logs in; stronger ones are left alone.
+HASH_METHOD = 'scrypt'      # werkzeug's default; or 'pbkdf2[:digest[:iterations]]'
+HASH_ITERATIONS = None      # PBKDF2 only. None = pick a count at startup that hits HASH_TARGET_MS
+HASH_TARGET_MS = 100        # Wanted time for one verify
+HASH_MIN_ITERATIONS = 600000  # werkzeug's own PBKDF2 default; calibration never goes lower
 
 
 # =============================================================================
 # PASSWORD FUNCTIONS
 # =============================================================================
 
+class HashingBusy(Exception):
+    """The hashing pool is full or did not answer in time."""
+
+
+_hash_pool = None
+_hash_slots = None
+_hash_pool_lock = threading.Lock()
+
+def _get_hash_pool():
+    global _hash_pool, _hash_slots
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+            _hash_slots = threading.BoundedSemaphore(HASH_QUEUE_SIZE)
+        return _hash_pool, _hash_slots
+
+def _run_hash_job(func, *args):
+    if HASH_WORKERS == 0:
+        return func(*args)
+
+    pool, slots = _get_hash_pool()
+    if not slots.acquire(blocking=False):
+        raise HashingBusy('Password hashing queue is full')
+
+    try:
+        future = pool.submit(func, *args)
+    except Exception:
+        slots.release()
+        raise
+    # The slot is freed when the job really finishes, even after a timeout
+    future.add_done_callback(lambda _: slots.release())
+
+    try:
+        return future.result(timeout=HASH_TIMEOUT_SECONDS)
+    except FutureTimeout:
+        raise HashingBusy('Password hashing timed out')
+
+_hash_method = 'scrypt'            # Passed to werkzeug; set by configure_hashing()
+_hash_policy = 'scrypt:32768:8:1'  # What werkzeug stores for it
+
+def configure_hashing():
+    """
+    Decide the hash method used for new passwords and return it.
+    For PBKDF2 without a fixed iteration count, time a short run on this
+    machine and scale the iteration count to reach HASH_TARGET_MS.
+    """
+    global _hash_method, _hash_policy
+    parts = HASH_METHOD.split(':')
+    if parts[0] == 'pbkdf2':
+        # werkzeug reads "pbkdf2[:digest[:iterations]]"
+        digest = parts[1] if len(parts) > 1 else 'sha256'
+        iterations = int(parts[2]) if len(parts) > 2 else HASH_ITERATIONS
+        if iterations is None:
+            sample = 20000
+            start = time.perf_counter()
+            generate_password_hash('calibration', method=f'pbkdf2:{digest}:{sample}')
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            iterations = int(sample * HASH_TARGET_MS / max(elapsed_ms, 0.001))
+            iterations = max(HASH_MIN_ITERATIONS, round(iterations, -4))
+        _hash_method = f'pbkdf2:{digest}:{iterations}'
+    else:
+        _hash_method = HASH_METHOD
+
+    # Compare stored hashes with what werkzeug really writes, which spells
+    # out defaults ("scrypt" is stored as "scrypt:32768:8:1")
+    _hash_policy = generate_password_hash('policy', method=_hash_method).split('$', 1)[0]
+    return _hash_method
+
+def needs_rehash(password_hash):
+    """True if the stored hash is weaker than the current policy."""
+    # Stored format is "<method>$<salt>$<hash>", e.g. "pbkdf2:sha256:600000$..."
+    method = password_hash.split('$', 1)[0]
+    if method == _hash_policy:
+        return False
+
+    stored, wanted = method.split(':'), _hash_policy.split(':')
+    try:
+        if stored[0] == 'scrypt':
+            # scrypt is memory-hard, so it beats any PBKDF2 policy.
+            # Against a scrypt policy, compare each of N, r and p.
+            return wanted[0] == 'scrypt' and any(
+                int(have) < int(want) for have, want in zip(stored[1:4], wanted[1:4]))
+        if stored[0] == 'pbkdf2':
+            if wanted[0] == 'scrypt':
+                return True
+            # Calibration varies a little between restarts; ignore counts within 20%
+            return int(stored[2]) < 0.8 * int(wanted[2])
+    except (IndexError, ValueError):
+        pass
+    return True  # Unknown or malformed format
+
 def hash_password(password):
-    return generate_password_hash(password)
+    return _run_hash_job(generate_password_hash, password, _hash_method)
 
 def verify_password(password, password_hash):
-    return check_password_hash(password_hash, password)
+    return _run_hash_job(check_password_hash, password_hash, password)
+
+def rehash_in_background(user_id, old_hash, password):
+    """Store a hash made with the current policy without delaying the login."""
+    from models import db, User
+    app = current_app._get_current_object()
+
+    def work():
+        try:
+            new_hash = hash_password(password)
+        except HashingBusy:
+            return  # Try again on the next login
+        with app.app_context():
+            # Only replace the hash we checked, never a newer password
+            User.query.filter_by(id=user_id, password_hash=old_hash).update(
+                {'password_hash': new_hash})
+            db.session.commit()
+
+    threading.Thread(target=work, daemon=True).start()
 
 
 # =============================================================================
@@ -33,15 +160,58 @@ def create_token(user_id):
     }
     return jwt.encode(payload, SECRET_KEY, algorithm='HS256')
 
-def decode_token(token):
+def decode_claims(token):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-        return payload['user_id']
+        return jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
+def decode_token(token):
+    payload = decode_claims(token)
+    return payload['user_id'] if payload else None
+
+
+# =============================================================================
+# VERIFIED TOKEN CACHE
+# =============================================================================
+# The dashboard polls the API with the same token over and over. Once a token
+# is verified we keep its claims and a copy of the user until the token
+# expires, so repeat requests skip both the HMAC check and the user query.
+
+class CachedUser:
+    """Detached copy of the user fields the routes read."""
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+
+
+_token_cache = OrderedDict()  # token -> (exp, claims, CachedUser), oldest first
+_token_cache_lock = threading.Lock()
+
+def _cached_token(token):
+    with _token_cache_lock:
+        entry = _token_cache.get(token)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del _token_cache[token]
+            return None
+        _token_cache.move_to_end(token)
+        return entry
+
+def _cache_token(token, claims, user):
+    snapshot = CachedUser(user)
+    with _token_cache_lock:
+        _token_cache[token] = (claims['exp'], claims, snapshot)
+        _token_cache.move_to_end(token)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return snapshot
+
 
 # =============================================================================
 # GET CURRENT USER (Helper Function)
@@ -66,14 +236,20 @@ def get_current_user():
 
     token = auth_header.split(' ')[1]
 
+    # Fast path: token was already verified and has not expired yet
+    cached = _cached_token(token)
+    if cached:
+        return cached[2], None
+
     # Step 3: Decode and validate token
-    user_id = decode_token(token)
-    if not user_id:
+    claims = decode_claims(token)
+    if not claims:
         return None, (jsonify({'error': 'Token is invalid or expired'}), 401)
 
     # Step 4: Get user from database
-    current_user = User.query.get(user_id)
+    current_user = User.query.get(claims['user_id'])
     if not current_user:
         return None, (jsonify({'error': 'User not found'}), 401)
 
-    return current_user, None
+    return _cache_token(token, claims, current_user), None
+
@@ -1,7 +1,7 @@
 # SOLUTION - app.py (completed)
 
 from flask import Flask, request, jsonify, render_template
-from models import db, User, Todo
+from models import db, User, Todo, PRIORITIES, upgrade_db
 from auth import hash_password, verify_password, create_token, token_required
 
 app = Flask(__name__)
@@ -12,6 +12,7 @@ db.init_app(app)
 
 with app.app_context():
     db.create_all()
+    upgrade_db()
 
 
 # ============================================
@@ -90,7 +91,21 @@ def login():
 @app.route('/api/todos', methods=['GET'])
 @token_required
 def get_todos(current_user):
-    todos = Todo.query.filter_by(user_id=current_user.id).all()
+    query = Todo.query.filter_by(user_id=current_user.id)
+
+    priority = request.args.get('priority')
+    if priority:
+        if priority not in PRIORITIES:
+            return jsonify({'error': 'priority must be low, medium or high'}), 400
+        query = query.filter_by(priority=PRIORITIES[priority])
+
+    sort = request.args.get('sort')
+    if sort == 'priority':
+        query = query.order_by(Todo.priority, Todo.created_at)
+    elif sort:
+        return jsonify({'error': 'sort must be priority'}), 400
+
+    todos = query.all()
     return jsonify({'todos': [todo.to_dict() for todo in todos]})
 
 
@@ -98,12 +113,15 @@ def get_todos(current_user):
 @token_required
 def create_todo(current_user):
     data = request.get_json()
+    priority = data.get('priority', 'medium')
+    if priority not in PRIORITIES:
+        return jsonify({'error': 'priority must be low, medium or high'}), 400
 
     todo = Todo(
         task_content=data['task_content'],
         user_id=current_user.id,
         # STEP 3: Added priority
-        priority=data.get('priority', 'medium')
+        priority=PRIORITIES[priority]
     )
 
     db.session.add(todo)
@@ -1,10 +1,16 @@
 # SOLUTION - models.py (completed)
 
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
 db = SQLAlchemy()
 
+# Priority is stored as a small integer so it sorts and indexes properly;
+# the API keeps using the names. 1 is the most important, like "P1".
+PRIORITIES = {'high': 1, 'medium': 2, 'low': 3}
+PRIORITY_NAMES = {number: name for name, number in PRIORITIES.items()}
+
 class User(db.Model):
     __tablename__ = 'users'
 
@@ -27,6 +33,10 @@ class User(db.Model):
 
 class Todo(db.Model):
     __tablename__ = 'todos'
+    __table_args__ = (
+        # A user's todos by priority (or of one priority), oldest first
+        db.Index('ix_todos_user_priority_created', 'user_id', 'priority', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     task_content = db.Column(db.String(200), nullable=False)
@@ -35,7 +45,7 @@ class Todo(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
     # STEP 1: Added priority column
-    priority = db.Column(db.String(10), default='medium')
+    priority = db.Column(db.SmallInteger, nullable=False, default=PRIORITIES['medium'], server_default='2')
 
     def to_dict(self):
         return {
@@ -45,5 +55,32 @@ class Todo(db.Model):
             'created_at': self.created_at.isoformat(),
             'user_id': self.user_id,
             # STEP 2: Added priority to dict
-            'priority': self.priority
+            'priority': PRIORITY_NAMES[self.priority]
         }
+
+
+# =============================================================================
+# SCHEMA UPGRADES
+# =============================================================================
+# db.create_all() only creates missing tables. This brings an existing
+# todo.db up to date, so you don't have to delete it.
+
+def upgrade_db():
+    columns = {c['name']: c['type'] for c in db.inspect(db.engine).get_columns('todos')}
+    with db.engine.begin() as conn:
+        if 'priority' not in columns:
+            conn.execute(db.text('ALTER TABLE todos ADD COLUMN priority SMALLINT NOT NULL DEFAULT 2'))
+        elif isinstance(columns['priority'], db.String):
+            # Made by the String(10) version of this homework: turn names into numbers
+            conn.execute(db.text('ALTER TABLE todos RENAME COLUMN priority TO priority_name'))
+            conn.execute(db.text('ALTER TABLE todos ADD COLUMN priority SMALLINT NOT NULL DEFAULT 2'))
+            conn.execute(db.text("""
+                UPDATE todos SET priority = CASE priority_name
+                    WHEN 'high' THEN 1 WHEN 'low' THEN 3 ELSE 2 END
+            """))
+            # DROP COLUMN needs SQLite 3.35+; an older one just keeps the unused column
+            if sqlite3.sqlite_version_info >= (3, 35, 0):
+                conn.execute(db.text('ALTER TABLE todos DROP COLUMN priority_name'))
+
+        for index in Todo.__table__.indexes:
+            index.create(conn, checkfirst=True)
@@ -0,0 +1,79 @@
+# =============================================================================
+# Shared test fixtures
+# =============================================================================
+# The tests import part 7's app from a temp copy of the folder (like the
+# benchmarks do), so they never touch the part's real instance/todo.db.
+
+import importlib
+import itertools
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='session')
+def part7(tmp_path_factory):
+    """The part-7 app.py module, imported from a temp copy."""
+    workdir = tmp_path_factory.mktemp('part-7')
+    shutil.copytree(os.path.join(ROOT, 'part-7-admin-panel'), workdir, dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns('instance', '__pycache__'))
+    sys.path.insert(0, str(workdir))
+    return importlib.import_module('app')
+
+
+@pytest.fixture(scope='session')
+def client(part7):
+    return part7.app.test_client()
+
+
+@pytest.fixture(scope='session')
+def make_user(part7):
+    """make_user(todos=0, is_admin=False) -> (user_id, auth headers)."""
+    from models import db, User, Todo
+    from auth import create_token
+    numbers = itertools.count()
+
+    def make(todos=0, is_admin=False):
+        n = next(numbers)
+        with part7.app.app_context():
+            user = User(username=f'user{n}', email=f'user{n}@example.com',
+                        password_hash='x', is_admin=is_admin)
+            db.session.add(user)
+            db.session.flush()
+            if todos:
+                db.session.execute(db.insert(Todo), [
+                    {'task_content': f'task {i}', 'is_completed': i % 2 == 0, 'user_id': user.id}
+                    for i in range(todos)
+                ])
+            db.session.commit()
+            token = create_token(user.id, user.is_admin, user.token_version)
+            return user.id, {'Authorization': f'Bearer {token}'}
+
+    return make
+
+
+@pytest.fixture(scope='session')
+def statements(part7):
+    """Context manager collecting (sql, parameters) of everything run inside it."""
+    from contextlib import contextmanager
+    from sqlalchemy import event
+    from models import db
+
+    @contextmanager
+    def collect():
+        seen = []
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            seen.append((statement, parameters))
+        with part7.app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            yield seen
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+
+    return collect
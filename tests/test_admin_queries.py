@@ -0,0 +1,29 @@
+# =============================================================================
+# Admin endpoints run a fixed number of queries (part 7)
+# =============================================================================
+# Owner names are joined in, so a page of todos from many different users is
+# one query, with no extra lookup per owner.
+
+import pytest
+
+
+@pytest.mark.parametrize('path', [
+    '/api/admin/todos',
+    '/api/admin/recent-activity',
+])
+@pytest.mark.parametrize('owners', [10, 200])
+def test_one_query_whatever_the_owners(part7, client, make_user, statements, path, owners):
+    _, headers = make_user(is_admin=True)
+    for _ in range(owners):
+        make_user(todos=1)
+    query_string = {'per_page': part7.ADMIN_MAX_PAGE_SIZE} if path == '/api/admin/todos' else {}
+    for _ in range(2):  # warm the token cache, then the token_version cache
+        client.get(path, headers=headers)
+
+    with statements() as sql:
+        response = client.get(path, headers=headers, query_string=query_string)
+    assert response.status_code == 200
+
+    queries = [statement for statement, _ in sql]
+    assert len(queries) == 1, queries
+    assert 'JOIN users' in queries[0]
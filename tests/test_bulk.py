@@ -0,0 +1,25 @@
+# =============================================================================
+# Bulk todo updates and deletes (part 7)
+# =============================================================================
+
+import pytest
+
+
+@pytest.mark.parametrize('method', ['put', 'delete'])
+def test_unfiltered_bulk_needs_all(part7, client, make_user, method):
+    _, headers = make_user(todos=4)
+    send = getattr(client, method)
+    body = {'json': {'is_completed': True}} if method == 'put' else {}
+
+    assert send('/api/todos/bulk', headers=headers, **body).status_code == 400
+    assert len(client.get('/api/todos', headers=headers).get_json()['todos']) == 4
+
+    response = send('/api/todos/bulk', headers=headers, query_string={'all': 1}, **body)
+    assert response.status_code == 200
+    assert response.get_json() == ({'updated': 2} if method == 'put' else {'deleted': 4})
+
+
+def test_filtered_bulk_delete(client, make_user):
+    _, headers = make_user(todos=4)
+    response = client.delete('/api/todos/bulk', headers=headers, query_string={'status': 'completed'})
+    assert response.get_json() == {'deleted': 2}
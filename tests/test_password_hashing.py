@@ -0,0 +1,49 @@
+# =============================================================================
+# Password hash upgrades (part 7)
+# =============================================================================
+# needs_rehash() only ever moves a stored hash to something stronger.
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+
+@pytest.fixture
+def policy(part7, monkeypatch):
+    """policy(method) switches auth to HASH_METHOD=method for one test."""
+    import auth
+    monkeypatch.setattr(auth, '_hash_method', auth._hash_method)
+    monkeypatch.setattr(auth, '_hash_policy', auth._hash_policy)
+
+    def use(method):
+        monkeypatch.setattr(auth, 'HASH_METHOD', method)
+        auth.configure_hashing()
+        return auth.needs_rehash
+
+    return use
+
+
+def stored(method):
+    return generate_password_hash('secret', method=method)
+
+
+def test_default_policy_is_werkzeug_default(policy):
+    needs_rehash = policy('scrypt')
+    assert not needs_rehash(stored('scrypt'))
+    assert not needs_rehash(generate_password_hash('secret'))
+    assert needs_rehash(stored('scrypt:16384:8:1'))
+    assert needs_rehash(stored('pbkdf2:sha256:600000'))
+    assert needs_rehash('plain-text')
+
+
+def test_pbkdf2_policy_never_downgrades(policy):
+    needs_rehash = policy('pbkdf2:sha256:600000')
+    assert not needs_rehash(stored('scrypt'))
+    assert not needs_rehash(stored('pbkdf2:sha256:600000'))
+    assert not needs_rehash(stored('pbkdf2:sha256:1000000'))
+    assert needs_rehash(stored('pbkdf2:sha256:300000'))
+
+
+def test_calibration_keeps_werkzeug_floor(policy, part7):
+    import auth
+    policy('pbkdf2')
+    assert int(auth._hash_method.split(':')[2]) >= 600000
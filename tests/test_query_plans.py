@@ -0,0 +1,52 @@
+# =============================================================================
+# Query plans of the hot todo queries (part 7)
+# =============================================================================
+# Runs the routes, captures the SQL they send, and checks EXPLAIN QUERY PLAN
+# for each statement on todos: they must go through an index, never a full
+# "SCAN todos" (an index walk shows up as "SCAN todos USING INDEX ...").
+
+import re
+
+import pytest
+
+FULL_SCAN = re.compile(r'\bSCAN todos\b(?! USING)')
+
+
+def todo_plans(part7, sql):
+    """EXPLAIN QUERY PLAN lines for every captured statement that reads todos."""
+    from models import db
+    plans = []
+    with part7.app.app_context():
+        for statement, parameters in sql:
+            if not statement.lstrip().upper().startswith('SELECT') or ' todos' not in statement:
+                continue
+            rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)
+            plans.append((statement, [row[-1] for row in rows]))
+    assert plans, 'no todo queries captured'
+    return plans
+
+
+@pytest.mark.parametrize('url', [
+    '/api/todos',
+    '/api/todos?status=completed',
+    '/api/todos?status=pending',
+])
+def test_todo_list_uses_index(part7, client, make_user, statements, url):
+    make_user(todos=50)
+    _, headers = make_user(todos=50)
+    with statements() as sql:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    for statement, plan in todo_plans(part7, sql):
+        assert not any(FULL_SCAN.search(line) for line in plan), (statement, plan)
+        assert not any('TEMP B-TREE' in line for line in plan), (statement, plan)
+
+
+def test_recent_activity_uses_index(part7, client, make_user, statements):
+    make_user(todos=50)
+    _, headers = make_user(is_admin=True)
+    with statements() as sql:
+        response = client.get('/api/admin/recent-activity', headers=headers)
+    assert response.status_code == 200
+    for statement, plan in todo_plans(part7, sql):
+        assert not any(FULL_SCAN.search(line) for line in plan), (statement, plan)
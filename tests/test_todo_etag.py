@@ -0,0 +1,45 @@
+# =============================================================================
+# Todo list ETag cache (part 7)
+# =============================================================================
+
+from sqlalchemy import event
+
+
+def test_version_read_across_a_write_is_not_cached(part7, make_user):
+    from models import db
+    user_id, _ = make_user(todos=1)
+
+    # A write lands (and calls todos_changed) while the version is being read
+    def write_meanwhile(conn, cursor, statement, parameters, context, executemany):
+        if 'todos_version' in statement:
+            part7.todos_changed(user_id)
+
+    with part7.app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', write_meanwhile)
+        try:
+            part7.todo_list_etag(user_id)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', write_meanwhile)
+        assert user_id not in part7._todo_versions
+
+        part7.todo_list_etag(user_id)
+        assert user_id in part7._todo_versions
+
+
+def test_weakened_etag_still_matches(client, make_user):
+    _, headers = make_user(todos=1)
+    etag = client.get('/api/todos', headers=headers).headers['ETag']
+    assert not etag.startswith('W/')
+
+    response = client.get('/api/todos', headers={**headers, 'If-None-Match': f'W/{etag}'})
+    assert response.status_code == 304
+
+
+def test_bad_arguments_beat_not_modified(client, make_user):
+    _, headers = make_user(todos=1)
+    etag = client.get('/api/todos', headers=headers).headers['ETag']
+    headers = {**headers, 'If-None-Match': etag}
+
+    assert client.get('/api/todos', headers=headers).status_code == 304
+    assert client.get('/api/todos?status=done', headers=headers).status_code == 400
+    assert client.get('/api/todos?cursor=nope', headers=headers).status_code == 400
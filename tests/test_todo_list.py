@@ -0,0 +1,19 @@
+# =============================================================================
+# GET /api/todos filters (part 7)
+# =============================================================================
+
+import pytest
+
+
+@pytest.mark.parametrize('status, code, count', [
+    (None, 200, 4),
+    ('completed', 200, 2),
+    ('pending', 200, 2),
+    ('done', 400, None),
+])
+def test_status_filter(client, make_user, status, code, count):
+    _, headers = make_user(todos=4)
+    response = client.get('/api/todos', headers=headers, query_string={'status': status} if status else {})
+    assert response.status_code == code
+    if count is not None:
+        assert len(response.get_json()['todos']) == count
@@ -0,0 +1,33 @@
+# =============================================================================
+# Token versions changed by another worker (part 7)
+# =============================================================================
+# A deletion or promotion handled elsewhere only reaches this process through
+# the users table, so it must show up once TOKEN_VERSION_TTL has passed.
+
+import pytest
+
+
+def bump_elsewhere(part7, user_id):
+    """What another worker's bump_token_version() + commit leaves behind."""
+    from models import db, User
+    with part7.app.app_context():
+        db.session.execute(db.update(User).where(User.id == user_id)
+                           .values(token_version=User.token_version + 1))
+        db.session.commit()
+
+
+@pytest.mark.parametrize('stateless', [False, True])
+def test_admin_token_rejected_after_ttl(part7, client, make_user, monkeypatch, stateless):
+    import auth
+    monkeypatch.setattr(auth, 'STATELESS_ADMIN_AUTH', stateless)
+    user_id, headers = make_user(is_admin=True)
+
+    assert client.get('/api/todos', headers=headers).status_code == 200        # cached token
+    assert client.get('/api/admin/recent-activity', headers=headers).status_code == 200
+
+    bump_elsewhere(part7, user_id)
+    assert client.get('/api/admin/recent-activity', headers=headers).status_code == 200
+
+    monkeypatch.setattr(auth, 'TOKEN_VERSION_TTL', 0)
+    assert client.get('/api/admin/recent-activity', headers=headers).status_code == 401
+    assert client.get('/api/todos', headers=headers).status_code == 401